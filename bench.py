@@ -0,0 +1,214 @@
+import os, sys, json, time, random, shutil, argparse, datetime, platform, threading, subprocess, tempfile, tracemalloc, statistics
+import multiprocessing as mp
+import hospital as h
+
+# ---------- Synthetic data ----------
+FIRST=("Aarav","Vivaan","Aditya","Arjun","Sai","Reyansh","Krishna","Ishaan","Rohan","Kabir","Ananya","Diya","Saanvi","Aadhya","Pari",
+       "Myra","Anika","Kavya","Meera","Priya","Ram","Sita","Lakshmi","Ravi","Suresh","Ramesh","Deepa","Neha","Pooja","Vikram")
+LAST=("Sharma","Verma","Patel","Reddy","Nair","Iyer","Gupta","Singh","Kumar","Das","Mehta","Joshi","Shete","Rao","Pillai","Bose","Khan","Menon")
+STREETS=("MG Road","Park Lane","Station Road","Nehru Nagar","Gandhi Chowk","Lake View","Temple Street","Market Road","Hill Road","Ring Road")
+CITIES=("Pune","Mumbai","Nashik","Nagpur","Bengaluru","Chennai","Hyderabad","Delhi")
+REASONS=("Fever","Checkup","Follow-up","Cough","Back pain","Diabetes review","BP check","Injury","Vaccination","Skin rash")
+SERVICES=(("Consultation",300),("Blood test",450),("X-Ray",800),("ECG",600),("Dressing",150),("Ward charges",1500),("Ultrasound",1200))
+DRUGS=("Paracetamol","Amoxicillin","Azithromycin","Ibuprofen","Cetirizine","Metformin","Amlodipine","Pantoprazole","Omeprazole","Atorvastatin",
+       "Losartan","Salbutamol","Insulin","Vitamin D3","Ondansetron","Diclofenac","Ranitidine","Montelukast","Levothyroxine","Prednisolone")
+
+def doctors(n=40): return [f"Dr. {LAST[i%len(LAST)]} {chr(65+i//len(LAST))}" for i in range(n)]
+
+def zipf_weights(n,s=1.1): return [1/(k+1)**s for k in range(n)]
+
+def patient_row(rnd,added):
+    name=f"{rnd.choice(FIRST)} {rnd.choice(LAST)}"; age=max(0,min(99,int(rnd.gauss(40,20))))
+    return (name,age,rnd.choices(("Male","Female","Other"),(49,49,2))[0],f"{rnd.choice('6789')}{rnd.randrange(10**9):09d}",
+            f"{rnd.randint(1,999)} {rnd.choice(STREETS)}, {rnd.choice(CITIES)}",added.isoformat())
+
+# Rows are spread evenly over `years` ending today; visit volume dips at weekends, doctor and patient
+# popularity follow Zipf-like skews, bill amounts and line counts are long-tailed.
+def generate(db,patients,appointments,bills,medicines=200,years=3,seed=1,chunk=50000,log=print):
+    rnd=random.Random(seed); h.DB=db; h.init_db(); t0=time.perf_counter()
+    start=datetime.datetime.now()-datetime.timedelta(days=365*years); span=365*years*86400
+    base=h.q("SELECT COALESCE(MAX(patient_id),0) FROM patients",(),"one")[0]
+    for lo in range(0,patients,chunk):
+        n=min(chunk,patients-lo)
+        with h.tx() as c:
+            c.executemany("INSERT INTO patients(name,age,gender,phone,address,added_on) VALUES(?,?,?,?,?,?)",
+                          (patient_row(rnd,start+datetime.timedelta(seconds=span*(lo+i)/patients)) for i in range(n)))
+        log(f"patients {lo+n:,}/{patients:,}")
+    npat=base+patients or 1
+    mids=[h.add_medicine(f"{DRUGS[i%len(DRUGS)]} {(i//len(DRUGS)+1)*50}mg","tablet" if i%3 else "syrup",round(rnd.lognormvariate(2,0.8),2),10**9)
+          for i in range(medicines)]
+    docs=doctors(); dw=zipf_weights(len(docs))
+    def pick_patient(): return int(npat*rnd.random()**1.6)+1
+    for lo in range(0,appointments,chunk):
+        n=min(chunk,appointments-lo); rows=[]
+        for i in range(n):
+            d=start+datetime.timedelta(seconds=span*(lo+i)/appointments)
+            if d.weekday()>=5 and rnd.random()<0.7: d+=datetime.timedelta(days=7-d.weekday())
+            m=rnd.randrange(9*60,17*60,15); w=d.replace(hour=m//60,minute=m%60,second=0,microsecond=0)
+            rows.append((pick_patient(),rnd.choices(docs,dw)[0],w.strftime("%Y-%m-%d"),w.strftime("%H:%M"),rnd.choice(REASONS),
+                         "Cancelled" if rnd.random()<0.08 else "Scheduled",d.isoformat(),w.strftime("%Y-%m-%dT%H:%M"),15))
+        with h.tx() as c:
+            c.executemany("""INSERT INTO appointments(patient_id,doctor,date,time,reason,status,created_on,starts_at,duration)
+                             VALUES(?,?,?,?,?,?,?,?,?)""",rows)
+        log(f"appointments {lo+n:,}/{appointments:,}")
+    days=max(1,365*years); per_day=bills/days; done=0
+    for k in range(days):
+        n=int(per_day*(k+1))-int(per_day*k)
+        if n: h.create_bills([(pick_patient(),bill_items(rnd,mids)) for _ in range(n)],(start+datetime.timedelta(days=k,hours=rnd.randint(9,19))).isoformat())
+        done+=n
+        if k%60==0 or k==days-1: log(f"bills {done:,}/{bills:,}")
+    h.q("PRAGMA optimize"); h.close_db()
+    return round(time.perf_counter()-t0,1)
+
+def bill_items(rnd,mids):
+    its=[]
+    for _ in range(min(8,1+int(rnd.expovariate(0.6)))):
+        if mids and rnd.random()<0.35: its.append({"description":"Medicine","qty":rnd.randint(1,30),"unit_price":round(rnd.lognormvariate(2,0.8),2),"medicine_id":rnd.choice(mids)})
+        else: d,p=rnd.choice(SERVICES); its.append({"description":d,"qty":1,"unit_price":round(p*rnd.uniform(0.8,1.3),2)})
+    return its
+
+# ---------- Timing ----------
+def stats(samples):
+    s=sorted(samples); pct=lambda p:s[min(len(s)-1,int(round(p/100*(len(s)-1))))]
+    return {"n":len(s),"mean_ms":round(statistics.fmean(s),3),"p50_ms":round(pct(50),3),"p90_ms":round(pct(90),3),
+            "p99_ms":round(pct(99),3),"max_ms":round(s[-1],3)}
+
+def timed(f,iterations):
+    out=[]
+    for _ in range(iterations):
+        t=time.perf_counter(); f(); out.append((time.perf_counter()-t)*1e3)
+    tracemalloc.start(); f(); peak=tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+    r=stats(out); r["py_heap_peak_kb"]=round(peak/1024,1); return r
+
+def read_paths(rnd,tmp):
+    npat=h.q("SELECT MAX(patient_id) FROM patients",(),"one")[0] or 1
+    nbill=h.q("SELECT MAX(bill_id) FROM bills",(),"one")[0] or 1
+    when=lambda:(datetime.date.today()-datetime.timedelta(days=rnd.randrange(1000))).isoformat()
+    def page(spec,key):
+        h.fetch_page(spec,None); h.fetch_page(spec,key())
+    def invoice():
+        inv=h.load_invoice(rnd.randint(1,nbill))
+        if inv: h.render_txt(*inv,tmp)
+    return {
+        "p_load":lambda:page(h.P_PAGE,lambda:(rnd.randint(1,npat),)),
+        "p_search":lambda:h.search_patients(rnd.choice(FIRST)[:rnd.randint(1,4)]+" "+rnd.choice(LAST)[:2]),
+        "m_search":lambda:h.search_medicines(rnd.choice(DRUGS)[:3]),
+        "a_load":lambda:page(h.A_PAGE,lambda:(when(),"12:00",0)),
+        "b_load":lambda:page(h.B_PAGE,lambda:(when(),0)),
+        "free_slots":lambda:(h.SCHEDULE.clear(),h.SCHEDULE.free_slots(rnd.choice(doctors()),None,5)),
+        "invoice_txt":invoice,
+        "dashboard":h.dashboard}
+
+def write_paths(rnd,mids):
+    npat=h.q("SELECT MAX(patient_id) FROM patients",(),"one")[0] or 1; docs=doctors()
+    def book():
+        d=datetime.date.today()+datetime.timedelta(days=rnd.randint(400,4000)); m=rnd.randrange(9*60,17*60,15)
+        try: h.SCHEDULE.book(rnd.randint(1,npat),rnd.choice(docs),datetime.datetime.combine(d,datetime.time(m//60,m%60)),"bench")
+        except ValueError: pass
+    return {"b_create":lambda:h.create_bill(rnd.randint(1,npat),bill_items(rnd,mids)),"a_book":book}
+
+def run_paths(paths,iterations):
+    return {k:timed(f,iterations) for k,f in paths.items()}
+
+# Stand-in for other billing terminals: keeps posting bills until told to stop. Runs in a spawned
+# process so it never shares the parent's SQLite connection. Waits at `ready` once its first bill is
+# in, so timing only starts when every writer is actually writing.
+def writer(db,stop,ready,count,seed):
+    h.DB=db; rnd=random.Random(seed); mids=[r[0] for r in h.q("SELECT medicine_id FROM medicines",(),"all")]
+    npat=h.q("SELECT MAX(patient_id) FROM patients",(),"one")[0] or 1
+    def post():
+        h.create_bill(rnd.randint(1,npat),bill_items(rnd,mids))
+        with count.get_lock(): count.value+=1
+    post(); ready.wait()
+    while not stop.is_set(): post()
+    h.close_db()
+
+def exports(tmp,since):
+    out={}
+    for t in h.EXPORTS:
+        path=os.path.join(tmp,f"{t}.csv.gz"); tracemalloc.start(); t0=time.perf_counter()
+        n=h.export_table(t,path,since if h.EXPORTS[t][2] else None)
+        secs=time.perf_counter()-t0; peak=tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+        out[t]={"rows":n,"seconds":round(secs,3),"rows_per_s":round(n/secs,1) if secs else None,"py_heap_peak_kb":round(peak/1024,1),"bytes":os.path.getsize(path)}
+    return out
+
+# Peak resident set of this process in KiB, or None if the platform won't say. resource is Unix-only
+# (and macOS reports bytes), so Windows asks GetProcessMemoryInfo instead.
+def max_rss_kb():
+    try: import resource
+    except ImportError: resource=None
+    if resource:
+        r=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; return r//1024 if sys.platform=="darwin" else r
+    try:
+        import ctypes; from ctypes import wintypes
+        class Counters(ctypes.Structure):
+            _fields_=[("cb",wintypes.DWORD),("PageFaultCount",wintypes.DWORD)]+[(f,ctypes.c_size_t) for f in (
+                "PeakWorkingSetSize","WorkingSetSize","QuotaPeakPagedPoolUsage","QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage","QuotaNonPagedPoolUsage","PagefileUsage","PeakPagefileUsage")]
+        k32,psapi=ctypes.windll.kernel32,ctypes.windll.psapi; k32.GetCurrentProcess.restype=wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes=(wintypes.HANDLE,ctypes.POINTER(Counters),wintypes.DWORD)
+        c=Counters(); c.cb=ctypes.sizeof(c)
+        if psapi.GetProcessMemoryInfo(k32.GetCurrentProcess(),ctypes.byref(c),c.cb): return c.PeakWorkingSetSize//1024
+    except (AttributeError,OSError): pass
+    return None
+
+def git_rev():
+    try: return subprocess.run(["git","rev-parse","--short","HEAD"],capture_output=True,text=True,cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError: return None
+
+def bench(db,iterations=200,writers=(0,2),since=None,invoice_batch=2000,seed=1,log=print):
+    h.DB=db; h.init_db(); rnd=random.Random(seed); tmp=tempfile.mkdtemp(prefix="hms-bench-")
+    mids=[r[0] for r in h.q("SELECT medicine_id FROM medicines",(),"all")]
+    counts={t:h.q(f"SELECT COUNT(*) FROM {t}",(),"one")[0] for t in ("patients","appointments","bills","bill_items","medicines")}
+    res={"meta":{"commit":git_rev(),"when":datetime.datetime.now().isoformat(timespec="seconds"),"python":platform.python_version(),
+                 "sqlite":h.sqlite3.sqlite_version,"cpus":os.cpu_count(),"db":os.path.abspath(db),
+                 "db_bytes":os.path.getsize(db),"rows":counts,"iterations":iterations},"runs":{}}
+    for nw in writers:
+        ctx=mp.get_context("spawn"); stop=ctx.Event(); ready=ctx.Barrier(nw+1); count=ctx.Value("i",0)
+        procs=[ctx.Process(target=writer,args=(db,stop,ready,count,seed+i+1),daemon=True) for i in range(nw)]
+        [p.start() for p in procs]; log(f"timing with {nw} concurrent writer(s)")
+        try:
+            if nw: ready.wait(timeout=120)
+            t0=time.perf_counter(); c0=count.value
+            run=run_paths(read_paths(rnd,tmp),iterations); run.update(run_paths(write_paths(rnd,mids),iterations))
+            log("timing exports"); run["exports"]=exports(tmp,since)
+            log("timing batch invoices")
+            hi=h.q("SELECT MAX(bill_id) FROM bills",(),"one")[0] or 0
+            lo=h.q("SELECT created_on FROM bills WHERE bill_id=?",(max(1,hi-invoice_batch),),"one")
+            run["batch_invoices"]=h.batch_invoices(since=lo and lo[0],fmt="txt",out=os.path.join(tmp,f"invoices_{nw}"))
+            bills,secs=count.value-c0,time.perf_counter()-t0
+        except threading.BrokenBarrierError:
+            raise RuntimeError(f"{nw} writer(s) did not start posting bills within 120s") from None
+        finally:
+            stop.set(); [p.join() for p in procs]
+        run["concurrent_writers"]={"processes":nw,"bills":bills,"bills_per_s":round(bills/secs,1)}
+        res["runs"][f"writers_{nw}"]=run
+    res["meta"]["max_rss_kb"]=max_rss_kb()
+    h.close_db(); shutil.rmtree(tmp,ignore_errors=True); return res
+
+# ---------- Command line ----------
+def main(argv):
+    ap=argparse.ArgumentParser(prog="bench.py",description="Build synthetic hospital databases and time the app's query paths.")
+    ap.add_argument("--db",default="bench.db"); sub=ap.add_subparsers(dest="cmd",required=True)
+    g=sub.add_parser("generate",help="add synthetic rows to --db")
+    g.add_argument("--patients",type=int,default=1_000_000); g.add_argument("--appointments",type=int,default=3_000_000)
+    g.add_argument("--bills",type=int,default=1_000_000); g.add_argument("--medicines",type=int,default=200)
+    g.add_argument("--years",type=int,default=3); g.add_argument("--seed",type=int,default=1)
+    r=sub.add_parser("run",help="time every query path and write JSON (adds bills and bookings to --db)")
+    r.add_argument("--iterations",type=int,default=200); r.add_argument("--writers",type=int,nargs="+",default=[0,2],help="concurrent writer counts to test")
+    r.add_argument("--since",default=(datetime.date.today()-datetime.timedelta(days=90)).isoformat(),help="start date for the export runs")
+    r.add_argument("--invoices",type=int,default=2000,help="bills in the batch invoice run"); r.add_argument("--seed",type=int,default=1)
+    r.add_argument("-o","--output",default="bench.json")
+    a=ap.parse_args(argv); log=lambda m:print(m,file=sys.stderr)
+    if a.cmd=="generate":
+        secs=generate(a.db,a.patients,a.appointments,a.bills,a.medicines,a.years,a.seed,log=log); log(f"Generated {a.db} in {secs}s")
+    if a.cmd=="run":
+        res=bench(a.db,a.iterations,a.writers,a.since,a.invoices,a.seed,log=log)
+        with open(a.output,"w",encoding="utf-8") as o: json.dump(res,o,indent=2)
+        for run,paths in res["runs"].items():
+            for k,v in paths.items():
+                if "p50_ms" in v: log(f"{run:10} {k:12} p50 {v['p50_ms']:8.3f}ms  p99 {v['p99_ms']:8.3f}ms")
+        log(f"Wrote {a.output}")
+    return 0
+
+if __name__=="__main__": sys.exit(main(sys.argv[1:]))
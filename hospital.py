@@ -1,4 +1,5 @@
-import sqlite3, os, csv, datetime, tkinter as tk
+import sqlite3, os, sys, re, csv, gzip, time, bisect, zipfile, tempfile, argparse, datetime, threading, contextlib, queue, collections, tkinter as tk
+from concurrent.futures import ProcessPoolExecutor
 from tkinter import ttk, messagebox, filedialog
 try:
     from fpdf import FPDF; HAS_PDF=True
@@ -7,53 +8,419 @@ except: HAS_PDF=False
 DB="hospital.db"
 
 # ---------- DB core ----------
+# One long-lived connection per thread (the Tk thread plus any workers), WAL so readers never block the writer.
+PRAGMAS=("journal_mode=WAL","synchronous=NORMAL","busy_timeout=30000","temp_store=MEMORY","cache_size=-32000","mmap_size=268435456")
+_local=threading.local(); _conns=[]; _conns_lock=threading.Lock()
+
+def conn():
+    c=getattr(_local,"c",None)
+    if c is not None and _local.db==DB: return c
+    if c is not None: c.close()
+    c=sqlite3.connect(DB,timeout=30,isolation_level=None,check_same_thread=False,cached_statements=256)
+    for p in PRAGMAS: c.execute("PRAGMA "+p)
+    _local.c,_local.db=c,DB
+    with _conns_lock: _conns.append(c)
+    return c
+
+def close_thread_db():
+    c=getattr(_local,"c",None); _local.c=None
+    if c is None: return
+    with _conns_lock:
+        if c in _conns: _conns.remove(c)
+    c.close()
+
+def close_db():
+    with _conns_lock:
+        for c in _conns:
+            try: c.execute("PRAGMA optimize"); c.close()
+            except sqlite3.Error: pass
+        _conns.clear()
+    _local.c=None
+
+@contextlib.contextmanager
+def tx():
+    # Statements inside run as one atomic unit; nested tx() blocks join the outer transaction.
+    c=conn()
+    if c.in_transaction: yield c; return
+    c.execute("BEGIN IMMEDIATE")
+    try: yield c
+    except BaseException: c.execute("ROLLBACK"); raise
+    c.execute("COMMIT")
+
 def q(sql,p=(),fetch=None):
-    with sqlite3.connect(DB) as c:
-        cur=c.cursor(); cur.execute(sql,p)
-        if fetch=="one": return cur.fetchone()
-        if fetch=="all": return cur.fetchall()
-        return cur.lastrowid if sql.strip().upper().startswith("INSERT") else None
+    cur=conn().execute(sql,p)
+    if fetch=="one": return cur.fetchone()
+    if fetch=="all": return cur.fetchall()
+    return cur.lastrowid if sql.strip().upper().startswith("INSERT") else None
 
-def init_db():
-    q("""CREATE TABLE IF NOT EXISTS patients(
-        patient_id INTEGER PRIMARY KEY, name TEXT NOT NULL, age INTEGER, gender TEXT, phone TEXT, address TEXT, added_on TEXT)""")
-    q("""CREATE TABLE IF NOT EXISTS appointments(
+# ---------- Full-text search ----------
+# External-content FTS5 indexes over patients and medicines, kept in sync by triggers.
+SEARCH_SCHEMA=(
+    """CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(name,phone,address,
+        content='patients',content_rowid='patient_id',tokenize='unicode61 remove_diacritics 2',prefix='1 2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_ai AFTER INSERT ON patients BEGIN
+        INSERT INTO patients_fts(rowid,name,phone,address) VALUES(new.patient_id,new.name,new.phone,new.address); END""",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_ad AFTER DELETE ON patients BEGIN
+        INSERT INTO patients_fts(patients_fts,rowid,name,phone,address) VALUES('delete',old.patient_id,old.name,old.phone,old.address); END""",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_au AFTER UPDATE OF name,phone,address ON patients BEGIN
+        INSERT INTO patients_fts(patients_fts,rowid,name,phone,address) VALUES('delete',old.patient_id,old.name,old.phone,old.address);
+        INSERT INTO patients_fts(rowid,name,phone,address) VALUES(new.patient_id,new.name,new.phone,new.address); END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS medicines_fts USING fts5(name,description,
+        content='medicines',content_rowid='medicine_id',tokenize='unicode61 remove_diacritics 2',prefix='1 2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS medicines_fts_ai AFTER INSERT ON medicines BEGIN
+        INSERT INTO medicines_fts(rowid,name,description) VALUES(new.medicine_id,new.name,new.description); END""",
+    """CREATE TRIGGER IF NOT EXISTS medicines_fts_ad AFTER DELETE ON medicines BEGIN
+        INSERT INTO medicines_fts(medicines_fts,rowid,name,description) VALUES('delete',old.medicine_id,old.name,old.description); END""",
+    """CREATE TRIGGER IF NOT EXISTS medicines_fts_au AFTER UPDATE OF name,description ON medicines BEGIN
+        INSERT INTO medicines_fts(medicines_fts,rowid,name,description) VALUES('delete',old.medicine_id,old.name,old.description);
+        INSERT INTO medicines_fts(rowid,name,description) VALUES(new.medicine_id,new.name,new.description); END""")
+
+def rebuild_search():
+    with tx():
+        for t in ("patients_fts","medicines_fts"): q(f"INSERT INTO {t}({t}) VALUES('rebuild')"); q(f"INSERT INTO {t}({t}) VALUES('optimize')")
+
+# Every word the user typed becomes a prefix term, so "ram 98" matches "Ram Kumar, 9876543210".
+def fts_query(kw): return " ".join(f'"{t}"*' for t in re.findall(r"\w+",kw))
+
+# Matches are ranked by bm25 inside the FTS query. Only when every typed word is a one- or two-letter
+# prefix, which can match most of the table, is ranking cut down to the first SEARCH_CANDIDATES matches.
+SEARCH_CANDIDATES=2000
+def search_sql(fts,weights,table,key,cols,ranked):
+    return f"""SELECT {cols} FROM (SELECT rowid,bm25({fts},{weights}) r FROM {fts} WHERE {fts} MATCH ?{' ORDER BY r' if ranked else ''} LIMIT ?) f
+    JOIN {table} x ON x.{key}=f.rowid ORDER BY f.r LIMIT ?"""
+P_COLS="x.patient_id,x.name,x.age,x.gender,x.phone,x.address,x.added_on"; M_COLS="x.medicine_id,x.name,x.description,x.price,x.stock"
+SEARCH_PATIENTS_SQL=search_sql("patients_fts","10,5,1","patients","patient_id",P_COLS,True)
+SEARCH_PATIENTS_SHORT_SQL=search_sql("patients_fts","10,5,1","patients","patient_id",P_COLS,False)
+SEARCH_MEDICINES_SQL=search_sql("medicines_fts","5,1","medicines","medicine_id",M_COLS,True)
+SEARCH_MEDICINES_SHORT_SQL=search_sql("medicines_fts","5,1","medicines","medicine_id",M_COLS,False)
+
+def search(kw,full,short,limit):
+    terms=re.findall(r"\w+",kw)
+    if not terms: return []
+    if max(map(len,terms))<=2: return q(short,(fts_query(kw),SEARCH_CANDIDATES,limit),"all")
+    return q(full,(fts_query(kw),limit,limit),"all")
+
+def search_patients(kw,limit=500): return search(kw,SEARCH_PATIENTS_SQL,SEARCH_PATIENTS_SHORT_SQL,limit)
+
+def search_medicines(kw,limit=500): return search(kw,SEARCH_MEDICINES_SQL,SEARCH_MEDICINES_SHORT_SQL,limit)
+
+# ---------- Scheduling ----------
+# Appointments keep their display date/time columns plus a normalized starts_at ("YYYY-MM-DDTHH:MM")
+# and a duration in minutes; (doctor, starts_at) is indexed.
+def parse_when(date,tm):
+    try: return datetime.datetime.strptime(f"{str(date).strip()} {str(tm).strip()}","%Y-%m-%d %H:%M")
+    except ValueError: raise ValueError(f"Invalid date/time {date!r} {tm!r}; use YYYY-MM-DD and HH:MM") from None
+
+def backfill_starts_at():
+    rows=[]
+    for aid,d,t in q("SELECT appointment_id,date,time FROM appointments WHERE starts_at IS NULL",(),"all"):
+        try: rows.append((parse_when(d,t).strftime("%Y-%m-%dT%H:%M"),aid))
+        except ValueError: pass
+    conn().executemany("UPDATE appointments SET starts_at=? WHERE appointment_id=?",rows)
+
+DAY_SQL="""SELECT starts_at,duration,appointment_id FROM appointments
+    WHERE doctor=? AND starts_at>=? AND starts_at<? AND status!='Cancelled' ORDER BY starts_at"""
+
+class SlotConflict(ValueError):
+    # Raised by Schedule.book_many; .times are the requested slots that clash, earliest first.
+    def __init__(s,doctor,times):
+        s.doctor,s.times=doctor,sorted(set(times))
+        super().__init__(f"{doctor} is already booked at "+", ".join(t.strftime('%Y-%m-%d %H:%M') for t in s.times))
+
+class Schedule:
+    # Per-doctor, per-day sorted lists of (start minute, end minute, appointment_id), loaded from the
+    # (doctor, starts_at) index on first use. Lookups never touch the database once a day is cached;
+    # bookings reload the day inside the write transaction so other terminals' bookings are seen.
+    def __init__(s,opens=9*60,closes=17*60,slot=15):
+        s.opens,s.closes,s.slot=opens,closes,slot; s.days={}; s.db=None; s.lock=threading.RLock()
+    def clear(s):
+        with s.lock: s.days.clear()
+    def _day(s,doctor,day,fresh=False):
+        with s.lock:
+            if s.db!=DB: s.days.clear(); s.db=DB
+            k=(doctor,day)
+            if fresh or k not in s.days:
+                s.days[k]=[(m:=int(st[11:13])*60+int(st[14:16]),m+(du or s.slot),aid)
+                           for st,du,aid in q(DAY_SQL,(doctor,day,day+"U"),"all")]
+            return s.days[k]
+    @staticmethod
+    def _clash(day,a,b):
+        i=bisect.bisect_left(day,(b,)); return [x for x in day[:i] if x[1]>a]
+    def conflicts(s,doctor,when,duration=None):
+        a=when.hour*60+when.minute; return s._clash(s._day(doctor,when.strftime("%Y-%m-%d")),a,a+(duration or s.slot))
+    def free_slots(s,doctor,after=None,n=5,duration=None,max_days=366):
+        after=after or datetime.datetime.now(); dur=duration or s.slot; out=[]
+        for k in range(max_days):
+            d=after.date()+datetime.timedelta(days=k); day=s._day(doctor,d.isoformat())
+            m=s.opens if k else max(s.opens,-(-(after.hour*60+after.minute)//s.slot)*s.slot)
+            while m+dur<=s.closes and len(out)<n:
+                c=s._clash(day,m,m+dur)
+                if c: m=max(m+s.slot,-(-max(x[1] for x in c)//s.slot)*s.slot); continue
+                out.append(datetime.datetime.combine(d,datetime.time(m//60,m%60))); m+=dur
+            if len(out)>=n: break
+        return out
+    def book(s,patient_id,doctor,when,reason="",duration=None):
+        return s.book_many(patient_id,doctor,[when],reason,duration)[0]
+    def book_recurring(s,patient_id,doctor,first,count,every=datetime.timedelta(weeks=1),reason="",duration=None):
+        if count<1: raise ValueError("Repeat count must be at least 1")
+        return s.book_many(patient_id,doctor,[first+every*i for i in range(count)],reason,duration)
+    # All-or-nothing: if any slot clashes nothing is booked and SlotConflict lists every clash.
+    # The cache only gains rows once they are committed; a failed or rolled-back booking drops the days instead.
+    def book_many(s,patient_id,doctor,whens,reason="",duration=None):
+        dur=duration or s.slot; ids=[]; doctor=doctor.strip()
+        if not doctor: raise ValueError("Doctor is required")
+        if not whens: raise ValueError("No appointment times given")
+        days={w.strftime("%Y-%m-%d") for w in whens}
+        with s.lock:
+            nested=conn().in_transaction
+            try:
+                with tx():
+                    for d in days: s._day(doctor,d,fresh=True)
+                    bad=[w for w in whens if s.conflicts(doctor,w,dur)]
+                    bad+=[w for i,w in enumerate(whens) if any(abs((w-v).total_seconds())<dur*60 for v in whens[:i])]
+                    if bad: raise SlotConflict(doctor,bad)
+                    for w in whens:
+                        ids.append(q("INSERT INTO appointments(patient_id,doctor,date,time,reason,created_on,starts_at,duration) VALUES(?,?,?,?,?,?,?,?)",
+                                     (patient_id,doctor,w.strftime("%Y-%m-%d"),w.strftime("%H:%M"),reason,now(),w.strftime("%Y-%m-%dT%H:%M"),dur)))
+            except BaseException:
+                for d in days: s.days.pop((doctor,d),None)
+                raise
+            # Inside a caller's transaction nothing is committed yet, so those days are reloaded on next use.
+            for w,aid in zip(whens,ids):
+                d=w.strftime("%Y-%m-%d")
+                if nested: s.days.pop((doctor,d),None)
+                else: m=w.hour*60+w.minute; bisect.insort(s._day(doctor,d),(m,m+dur,aid))
+        return ids
+    def cancel(s,appointment_id):
+        with s.lock:
+            q("UPDATE appointments SET status='Cancelled' WHERE appointment_id=?",(appointment_id,))
+            for day in s.days.values(): day[:]=[x for x in day if x[2]!=appointment_id]
+
+SCHEDULE=Schedule()
+
+# ---------- Reporting rollups ----------
+# Summary tables maintained by triggers on every write path (billing, booking, cancelling, stock edits),
+# so the dashboard reads a handful of rows however much history there is.
+# Keys are coalesced to '' so rows with no doctor or date roll up into one row rather than one per NULL.
+LOW_STOCK=20
+ROLLUP_SCHEMA=(
+    "CREATE TABLE IF NOT EXISTS daily_revenue(day TEXT PRIMARY KEY, bills INTEGER NOT NULL, revenue REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS daily_visits(day TEXT PRIMARY KEY, visits INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS doctor_visits(doctor TEXT PRIMARY KEY, booked INTEGER NOT NULL, cancelled INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS low_stock(medicine_id INTEGER PRIMARY KEY, name TEXT, stock INTEGER)",
+    "CREATE INDEX IF NOT EXISTS low_stock_level ON low_stock(stock)",
+    """CREATE TRIGGER IF NOT EXISTS bills_rollup_ai AFTER INSERT ON bills BEGIN
+        INSERT INTO daily_revenue VALUES(coalesce(substr(new.created_on,1,10),''),1,coalesce(new.total,0))
+            ON CONFLICT(day) DO UPDATE SET bills=bills+1,revenue=revenue+excluded.revenue; END""",
+    """CREATE TRIGGER IF NOT EXISTS bills_rollup_ad AFTER DELETE ON bills BEGIN
+        UPDATE daily_revenue SET bills=bills-1,revenue=revenue-coalesce(old.total,0) WHERE day=coalesce(substr(old.created_on,1,10),''); END""",
+    """CREATE TRIGGER IF NOT EXISTS bills_rollup_au AFTER UPDATE OF total,created_on ON bills BEGIN
+        UPDATE daily_revenue SET bills=bills-1,revenue=revenue-coalesce(old.total,0) WHERE day=coalesce(substr(old.created_on,1,10),'');
+        INSERT INTO daily_revenue VALUES(coalesce(substr(new.created_on,1,10),''),1,coalesce(new.total,0))
+            ON CONFLICT(day) DO UPDATE SET bills=bills+1,revenue=revenue+excluded.revenue; END""",
+    """CREATE TRIGGER IF NOT EXISTS appointments_rollup_ai AFTER INSERT ON appointments BEGIN
+        INSERT INTO doctor_visits VALUES(coalesce(new.doctor,''),1,new.status='Cancelled')
+            ON CONFLICT(doctor) DO UPDATE SET booked=booked+1,cancelled=cancelled+excluded.cancelled;
+        INSERT INTO daily_visits VALUES(coalesce(substr(new.starts_at,1,10),new.date,''),new.status!='Cancelled')
+            ON CONFLICT(day) DO UPDATE SET visits=visits+excluded.visits; END""",
+    """CREATE TRIGGER IF NOT EXISTS appointments_rollup_ad AFTER DELETE ON appointments BEGIN
+        UPDATE doctor_visits SET booked=booked-1,cancelled=cancelled-(old.status='Cancelled') WHERE doctor=coalesce(old.doctor,'');
+        UPDATE daily_visits SET visits=visits-(old.status!='Cancelled') WHERE day=coalesce(substr(old.starts_at,1,10),old.date,''); END""",
+    """CREATE TRIGGER IF NOT EXISTS appointments_rollup_au AFTER UPDATE OF status ON appointments
+        WHEN (old.status='Cancelled')!=(new.status='Cancelled') BEGIN
+        UPDATE doctor_visits SET cancelled=cancelled+(new.status='Cancelled')-(old.status='Cancelled') WHERE doctor=coalesce(new.doctor,'');
+        UPDATE daily_visits SET visits=visits+(old.status='Cancelled')-(new.status='Cancelled') WHERE day=coalesce(substr(new.starts_at,1,10),new.date,''); END""",
+    f"""CREATE TRIGGER IF NOT EXISTS medicines_rollup_ai AFTER INSERT ON medicines WHEN new.stock<{LOW_STOCK} BEGIN
+        INSERT INTO low_stock VALUES(new.medicine_id,new.name,new.stock); END""",
+    f"""CREATE TRIGGER IF NOT EXISTS medicines_rollup_au AFTER UPDATE OF name,stock ON medicines BEGIN
+        DELETE FROM low_stock WHERE medicine_id=old.medicine_id;
+        INSERT INTO low_stock SELECT new.medicine_id,new.name,new.stock WHERE new.stock<{LOW_STOCK}; END""",
+    """CREATE TRIGGER IF NOT EXISTS medicines_rollup_ad AFTER DELETE ON medicines BEGIN
+        DELETE FROM low_stock WHERE medicine_id=old.medicine_id; END""")
+
+def rebuild_rollups():
+    with tx():
+        for t in ("daily_revenue","daily_visits","doctor_visits","low_stock"): q(f"DELETE FROM {t}")
+        q("INSERT INTO daily_revenue SELECT coalesce(substr(created_on,1,10),''),COUNT(*),coalesce(SUM(total),0) FROM bills GROUP BY 1")
+        q("""INSERT INTO daily_visits SELECT coalesce(substr(starts_at,1,10),date,''),SUM(status!='Cancelled') FROM appointments GROUP BY 1""")
+        q("INSERT INTO doctor_visits SELECT coalesce(doctor,''),COUNT(*),SUM(status='Cancelled') FROM appointments GROUP BY 1")
+        q(f"INSERT INTO low_stock SELECT medicine_id,name,stock FROM medicines WHERE stock<{LOW_STOCK}")
+
+DASHBOARD={
+    "today":"SELECT (SELECT bills FROM daily_revenue WHERE day=?),(SELECT revenue FROM daily_revenue WHERE day=?),(SELECT visits FROM daily_visits WHERE day=?)",
+    "revenue":"SELECT day,bills,printf('%.2f',revenue) FROM daily_revenue ORDER BY day DESC LIMIT 14",
+    "visits":"SELECT day,visits FROM daily_visits WHERE day>=? ORDER BY day LIMIT 14",
+    "doctors":"SELECT doctor,booked-cancelled,cancelled FROM doctor_visits ORDER BY booked-cancelled DESC LIMIT 50",
+    "low_stock":"SELECT medicine_id,name,stock FROM low_stock ORDER BY stock LIMIT 50"}
+
+def dashboard(day=None):
+    day=day or datetime.date.today().isoformat(); r={k:q(sql,(),"all") for k,sql in DASHBOARD.items() if "?" not in sql}
+    r["today"]=q(DASHBOARD["today"],(day,day,day),"one"); r["visits"]=q(DASHBOARD["visits"],(day,),"all"); return r
+
+# ---------- Schema ----------
+# MIGRATIONS[n-1] takes a database from user_version n-1 to n. Steps are SQL strings or callables.
+# Append new entries; never edit one that has shipped.
+MIGRATIONS=[
+    ("""CREATE TABLE IF NOT EXISTS patients(
+        patient_id INTEGER PRIMARY KEY, name TEXT NOT NULL, age INTEGER, gender TEXT, phone TEXT, address TEXT, added_on TEXT)""",
+     """CREATE TABLE IF NOT EXISTS appointments(
         appointment_id INTEGER PRIMARY KEY, patient_id INTEGER, doctor TEXT, date TEXT, time TEXT, reason TEXT,
-        status TEXT DEFAULT 'Scheduled', created_on TEXT, FOREIGN KEY(patient_id) REFERENCES patients(patient_id))""")
-    q("""CREATE TABLE IF NOT EXISTS medicines(
-        medicine_id INTEGER PRIMARY KEY, name TEXT NOT NULL, description TEXT, price REAL NOT NULL, stock INTEGER DEFAULT 0)""")
-    q("""CREATE TABLE IF NOT EXISTS bills(
-        bill_id INTEGER PRIMARY KEY, patient_id INTEGER, total REAL, created_on TEXT)""")
-    q("""CREATE TABLE IF NOT EXISTS bill_items(
-        id INTEGER PRIMARY KEY, bill_id INTEGER, description TEXT, qty INTEGER, unit_price REAL, amount REAL)""")
+        status TEXT DEFAULT 'Scheduled', created_on TEXT, FOREIGN KEY(patient_id) REFERENCES patients(patient_id))""",
+     """CREATE TABLE IF NOT EXISTS medicines(
+        medicine_id INTEGER PRIMARY KEY, name TEXT NOT NULL, description TEXT, price REAL NOT NULL, stock INTEGER DEFAULT 0)""",
+     """CREATE TABLE IF NOT EXISTS bills(
+        bill_id INTEGER PRIMARY KEY, patient_id INTEGER, total REAL, created_on TEXT)""",
+     """CREATE TABLE IF NOT EXISTS bill_items(
+        id INTEGER PRIMARY KEY, bill_id INTEGER, description TEXT, qty INTEGER, unit_price REAL, amount REAL)"""),
+    SEARCH_SCHEMA+(rebuild_search,),
+    ("CREATE INDEX IF NOT EXISTS appointments_when ON appointments(date,time)",
+     "CREATE INDEX IF NOT EXISTS appointments_patient ON appointments(patient_id)",
+     "CREATE INDEX IF NOT EXISTS bills_recent ON bills(created_on,bill_id,patient_id,total)",
+     "CREATE INDEX IF NOT EXISTS bills_patient ON bills(patient_id,created_on)",
+     "CREATE INDEX IF NOT EXISTS bill_items_bill ON bill_items(bill_id)"),
+    ("ALTER TABLE appointments ADD COLUMN starts_at TEXT",
+     "ALTER TABLE appointments ADD COLUMN duration INTEGER DEFAULT 15",
+     backfill_starts_at,
+     "CREATE INDEX IF NOT EXISTS appointments_doctor ON appointments(doctor,starts_at)"),
+    ROLLUP_SCHEMA+(rebuild_rollups,),
+    ("""CREATE TABLE IF NOT EXISTS stock_moves(id INTEGER PRIMARY KEY, medicine_id INTEGER NOT NULL, delta INTEGER NOT NULL,
+        reason TEXT, bill_id INTEGER, created_on TEXT)""",
+     "CREATE INDEX IF NOT EXISTS stock_moves_medicine ON stock_moves(medicine_id)",
+     "ALTER TABLE bill_items ADD COLUMN medicine_id INTEGER",
+     """INSERT INTO stock_moves(medicine_id,delta,reason,created_on)
+        SELECT medicine_id,stock,'opening balance',strftime('%Y-%m-%dT%H:%M:%S','now','localtime') FROM medicines WHERE stock!=0"""),
+    # Version 5's rollup triggers gave every NULL doctor/day its own row; replace them and recount.
+    tuple(f"DROP TRIGGER IF EXISTS {t}_rollup_{op}" for t in ("bills","appointments") for op in ("ai","ad","au"))+ROLLUP_SCHEMA+(rebuild_rollups,),
+]
+
+def init_db():
+    with tx():
+        v=q("PRAGMA user_version",(),"one")[0]
+        for n,steps in enumerate(MIGRATIONS[v:],v+1):
+            for st in steps: st() if callable(st) else q(st)
+            q(f"PRAGMA user_version={n}")
 
 # ---------- Small helpers ----------
 now = lambda: datetime.datetime.now().isoformat()
-def export_csv(rows, headers, name):
-    f=filedialog.asksaveasfilename(defaultextension=".csv",initialfile=name,filetypes=[("CSV","*.csv")]); 
-    if not f: return
-    with open(f,"w",newline="",encoding="utf-8") as o: w=csv.writer(o); w.writerow(headers); w.writerows(rows)
-    messagebox.showinfo("Exported",f"Saved {f}")
+# ---------- Streaming export ----------
+# name -> (query, CSV headers, date column used by --since/--until)
+EXPORTS={
+    "patients":("SELECT patient_id,name,age,gender,phone,address,added_on FROM patients",
+                ["patient_id","name","age","gender","phone","address","added_on"],"added_on"),
+    "appointments":("""SELECT a.appointment_id,a.patient_id,p.name,a.doctor,a.date,a.time,a.reason,a.status
+                       FROM appointments a JOIN patients p ON a.patient_id=p.patient_id""",
+                    ["appointment_id","patient_id","patient_name","doctor","date","time","reason","status"],"a.date"),
+    "medicines":("SELECT medicine_id,name,description,price,stock FROM medicines",
+                 ["medicine_id","name","description","price","stock"],None),
+    "bills":("SELECT b.bill_id,b.patient_id,p.name,b.total,b.created_on FROM bills b JOIN patients p ON b.patient_id=p.patient_id",
+             ["bill_id","patient_id","patient_name","total","created_on"],"b.created_on")}
 
-def invoice_txt(bill_id):
-    b=q("SELECT bill_id,patient_id,total,created_on FROM bills WHERE bill_id=?", (bill_id,), "one"); 
-    its=q("SELECT description,qty,unit_price,amount FROM bill_items WHERE bill_id=?", (bill_id,), "all")
-    p=q("SELECT name,age,gender,phone,address FROM patients WHERE patient_id=?", (b[1],), "one") if b else None
-    if not (b and p): return None
+def export_sql(name,since=None,until=None):
+    sql,_,col=EXPORTS[name]; conds=[]; params=[]
+    if (since or until) and not col: raise ValueError(f"{name} has no date column to filter on")
+    if since: conds.append(f"{col}>=?"); params.append(since)
+    if until: conds.append(f"{col}<?"); params.append(until)
+    return sql+(" WHERE "+" AND ".join(conds) if conds else ""),params
+
+# Rows are pulled `chunk` at a time and written straight out, so memory stays flat whatever the table size.
+# Writes go to a .part file that only replaces `path` once complete; returns the row count, or None if cancelled.
+def export_rows(sql,params,headers,path,chunk=5000,progress=None,cancel=None):
+    out=sys.stdout if path=="-" else None; tmp=path+".part"
+    if not out: out=(gzip.open(tmp,"wt",newline="",encoding="utf-8") if path.endswith(".gz") else open(tmp,"w",newline="",encoding="utf-8"))
+    n=0; cur=None; done=False
+    try:
+        try:
+            cur=conn().execute(sql,params); w=csv.writer(out); w.writerow(headers)
+            while rows:=cur.fetchmany(chunk):
+                if cancel and cancel.is_set(): break
+                w.writerows(rows); n+=len(rows)
+                if progress: progress(n)
+        finally:
+            if cur: cur.close()
+            if path!="-": out.close()
+        if cancel and cancel.is_set(): return None
+        if path!="-": os.replace(tmp,path)
+        done=True; return n
+    finally:
+        # Cancelled or failed: never leave a half-written .part behind.
+        if not done and path!="-":
+            with contextlib.suppress(OSError): os.remove(tmp)
+
+def export_table(name,path,since=None,until=None,**kw):
+    sql,params=export_sql(name,since,until); return export_rows(sql,params,EXPORTS[name][1],path,**kw)
+
+# ---------- Pharmacy stock ----------
+# stock_moves is the ledger; medicines.stock is the cached balance. Both change in the same transaction,
+# and decrements are conditional (stock>=qty), so several terminals dispensing at once can neither lose
+# updates nor drive stock negative.
+def dispense(lines,reason="dispensed"):
+    # lines: iterable of (medicine_id, qty, bill_id or None); all or nothing.
+    ts=now(); moves=[]
+    with tx() as c:
+        for mid,qty,bid in lines:
+            if qty<=0: raise ValueError(f"Quantity must be positive (medicine {mid})")
+            if c.execute("UPDATE medicines SET stock=stock-? WHERE medicine_id=? AND stock>=?",(qty,mid,qty)).rowcount!=1:
+                r=c.execute("SELECT name,stock FROM medicines WHERE medicine_id=?",(mid,)).fetchone()
+                raise ValueError(f"Only {r[1]} of {r[0]} in stock, {qty} requested" if r else f"Unknown medicine {mid}")
+            moves.append((mid,-qty,reason,bid,ts))
+        c.executemany("INSERT INTO stock_moves(medicine_id,delta,reason,bill_id,created_on) VALUES(?,?,?,?,?)",moves)
+
+def adjust_stock(medicine_id,delta,reason="adjustment"):
+    with tx() as c:
+        if c.execute("UPDATE medicines SET stock=stock+? WHERE medicine_id=? AND stock+?>=0",(delta,medicine_id,delta)).rowcount!=1:
+            raise ValueError(f"Adjustment would make stock of medicine {medicine_id} negative")
+        c.execute("INSERT INTO stock_moves(medicine_id,delta,reason,created_on) VALUES(?,?,?,?)",(medicine_id,delta,reason,now()))
+
+def add_medicine(name,description,price,stock=0):
+    with tx():
+        mid=q("INSERT INTO medicines(name,description,price,stock) VALUES(?,?,?,0)",(name,description,price))
+        if stock: adjust_stock(mid,stock,"initial stock")
+    return mid
+
+# Medicines whose cached balance disagrees with their ledger (should always be empty).
+VERIFY_STOCK_SQL="""SELECT m.medicine_id,m.name,m.stock,(SELECT COALESCE(SUM(delta),0) FROM stock_moves s WHERE s.medicine_id=m.medicine_id) l
+    FROM medicines m WHERE m.stock!=l"""
+def verify_stock(): return q(VERIFY_STOCK_SQL,(),"all")
+
+# ---------- Billing service ----------
+# bills: iterable of (patient_id, items) with items as {"description","qty","unit_price"} dicts, plus an
+# optional "medicine_id" for pharmacy lines, which are dispensed from stock as part of the same transaction.
+# Everything is written in one transaction; bill ids are reserved up front so items go in via executemany.
+def create_bills(bills,created_on=None):
+    ts=created_on or now(); heads=[]; rows=[]
+    with tx() as c:
+        bid=c.execute("SELECT COALESCE(MAX(bill_id),0) FROM bills").fetchone()[0]
+        for pid,items in bills:
+            if not items: raise ValueError(f"Bill for patient {pid} has no items")
+            bid+=1; total=0
+            for it in items:
+                amt=it["qty"]*it["unit_price"]; total+=amt
+                rows.append((bid,it["description"],it["qty"],it["unit_price"],amt,it.get("medicine_id")))
+            heads.append((bid,pid,total,ts))
+        c.executemany("INSERT INTO bills(bill_id,patient_id,total,created_on) VALUES(?,?,?,?)",heads)
+        c.executemany("INSERT INTO bill_items(bill_id,description,qty,unit_price,amount,medicine_id) VALUES(?,?,?,?,?,?)",rows)
+        dispense([(r[5],r[2],r[0]) for r in rows if r[5] is not None])
+    return [h[0] for h in heads]
+
+def create_bill(patient_id,items): return create_bills([(patient_id,items)])[0]
+
+BILL_SQL="SELECT bill_id,patient_id,total,created_on FROM bills WHERE bill_id=?"
+ITEMS_SQL="SELECT description,qty,unit_price,amount FROM bill_items WHERE bill_id=? ORDER BY id"
+PATIENT_SQL="SELECT name,age,gender,phone,address FROM patients WHERE patient_id=?"
+
+# b=(bill_id,patient_id,total,created_on), p=(name,age,gender,phone,address), its=[(description,qty,unit_price,amount)]
+def render_txt(b,p,its,out):
     lines=[ "=== Hospital Invoice ===", f"Bill ID: {b[0]}", f"Date: {b[3]}", "", "Patient:",
             f"  Name: {p[0]}", f"  Age/Gender: {p[1]} / {p[2]}", f"  Phone: {p[3]}", f"  Address: {p[4]}", "",
             f"{'Description':40} {'Qty':>3} {'Unit':>8} {'Amount':>10}" ]
-    for d,qy,u,a in its: lines.append(f"{d[:40]:40} {qy:>3} {u:>8.2f} {a:>10.2f}")
+    for d,qy,u,a in its: lines.append(f"{str(d)[:40]:40} {qy:>3} {u:>8.2f} {a:>10.2f}")
     lines+=["",f"TOTAL: {b[2]:.2f}"]
-    fn=os.path.join(os.getcwd(),f"invoice_{b[0]}.txt"); open(fn,"w",encoding="utf-8").write("\n".join(lines)); return fn
+    fn=os.path.join(out,f"invoice_{b[0]}.txt")
+    with open(fn,"w",encoding="utf-8") as o: o.write("\n".join(lines))
+    return fn
 
-def invoice_pdf(bill_id):
-    if not HAS_PDF: return None
-    b=q("SELECT bill_id,patient_id,total,created_on FROM bills WHERE bill_id=?", (bill_id,), "one"); 
-    its=q("SELECT description,qty,unit_price,amount FROM bill_items WHERE bill_id=?", (bill_id,), "all")
-    p=q("SELECT name,age,gender,phone,address FROM patients WHERE patient_id=?", (b[1],), "one") if b else None
-    if not (b and p): return None
-    fn=os.path.join(os.getcwd(),f"invoice_{b[0]}.pdf"); pdf=FPDF(); pdf.add_page(); pdf.set_font("Arial",size=12)
+def render_pdf(b,p,its,out):
+    fn=os.path.join(out,f"invoice_{b[0]}.pdf"); pdf=FPDF(); pdf.add_page(); pdf.set_font("Arial",size=12)
     for t in ("Hospital Invoice",): pdf.cell(0,8,t,ln=1,align="C"); pdf.ln(2)
     for t in (f"Bill ID: {b[0]}",f"Date: {b[3]}", "", f"Patient: {p[0]} ({p[1]}/{p[2]})", f"Phone: {p[3]}", f"Address: {p[4]}"):
         pdf.cell(0,6,t,ln=1)
@@ -61,18 +428,215 @@ def invoice_pdf(bill_id):
     for w,t,a in ((90,"Description","L"),(20,"Qty","C"),(30,"Unit","R"),(30,"Amount","R")): pdf.cell(w,6,t,1,0,a)
     pdf.ln()
     for d,qy,u,a in its:
-        for w,t,a2 in ((90,d[:45],"L"),(20,str(qy),"C"),(30,f"{u:.2f}","R"),(30,f"{a:.2f}","R")): pdf.cell(w,6,t,1,0,a2)
+        for w,t,a2 in ((90,str(d)[:45],"L"),(20,str(qy),"C"),(30,f"{u:.2f}","R"),(30,f"{a:.2f}","R")): pdf.cell(w,6,t,1,0,a2)
         pdf.ln()
     pdf.ln(3); pdf.set_font("Arial","B",12); pdf.cell(0,6,f"TOTAL: {b[2]:.2f}",ln=1); pdf.output(fn); return fn
 
+RENDERERS={"txt":render_txt,"pdf":render_pdf}
+
+def load_invoice(bill_id):
+    b=q(BILL_SQL,(bill_id,),"one"); its=q(ITEMS_SQL,(bill_id,),"all"); p=q(PATIENT_SQL,(b[1],),"one") if b else None
+    return (b,p,its) if b and p else None
+
+def invoice_txt(bill_id):
+    inv=load_invoice(bill_id); return render_txt(*inv,os.getcwd()) if inv else None
+
+def invoice_pdf(bill_id):
+    if not HAS_PDF: return None
+    inv=load_invoice(bill_id); return render_pdf(*inv,os.getcwd()) if inv else None
+
+# ---------- Batch invoices ----------
+# Bills are read in chunks: one query for headers+patients and one IN (...) query for their items per chunk,
+# instead of three lookups per bill. Each chunk is rendered by a worker process.
+BATCH_SQL="""SELECT b.bill_id,b.patient_id,b.total,b.created_on,p.name,p.age,p.gender,p.phone,p.address
+    FROM bills b CROSS JOIN patients p ON p.patient_id=b.patient_id"""
+BATCH_ITEMS_SQL="SELECT bill_id,description,qty,unit_price,amount FROM bill_items WHERE bill_id IN ({}) ORDER BY bill_id,id"
+
+def batch_items_sql(n): return BATCH_ITEMS_SQL.format(",".join("?"*n))
+
+def render_chunk(fmt,jobs,out): return [RENDERERS[fmt](b,p,its,out) for b,p,its in jobs]
+
+def batch_sql(since=None,until=None,patient=None):
+    conds=[]; params=[]
+    if patient is not None: conds.append("b.patient_id=?"); params.append(patient)
+    if since: conds.append("b.created_on>=?"); params.append(since)
+    if until: conds.append("b.created_on<?"); params.append(until)
+    return BATCH_SQL+(" WHERE "+" AND ".join(conds) if conds else "")+" ORDER BY b.created_on,b.bill_id",params
+
+def batch_invoices(since=None,until=None,patient=None,fmt="pdf",out=".",zip_path=None,workers=None,chunk=500,progress=None):
+    if fmt=="pdf" and not HAS_PDF: raise RuntimeError("Install: pip install fpdf")
+    os.makedirs(out,exist_ok=True); t0=time.perf_counter()
+    work=tempfile.mkdtemp(dir=out) if zip_path else out
+    nw=workers or os.cpu_count() or 1; ex=ProcessPoolExecutor(nw) if nw>1 else None
+    pending=collections.deque(); files=[]
+    def drain(keep):
+        while len(pending)>keep:
+            files.extend(pending.popleft().result())
+            if progress: progress(len(files))
+    sql,params=batch_sql(since,until,patient); cur=conn().execute(sql,params)
+    try:
+        while heads:=cur.fetchmany(chunk):
+            ids=[h[0] for h in heads]; items=collections.defaultdict(list)
+            for r in q(batch_items_sql(len(ids)),ids,"all"):
+                items[r[0]].append(r[1:])
+            jobs=[(h[:4],h[4:],items[h[0]]) for h in heads]
+            if ex: pending.append(ex.submit(render_chunk,fmt,jobs,work)); drain(2*nw)
+            else:
+                files+=render_chunk(fmt,jobs,work)
+                if progress: progress(len(files))
+        drain(0)
+    finally:
+        cur.close()
+        if ex: ex.shutdown(cancel_futures=True)
+    n=len(files)
+    if zip_path:
+        with zipfile.ZipFile(zip_path,"w",zipfile.ZIP_DEFLATED) as z:
+            for f in files: z.write(f,os.path.basename(f)); os.remove(f)
+        os.rmdir(work); files=[zip_path]
+    secs=time.perf_counter()-t0
+    return {"invoices":n,"seconds":round(secs,3),"per_second":round(n/secs,1) if secs else None,"output":zip_path or out}
+
+# ---------- Keyset paging ----------
+# Page spec: (select, key columns, key positions in each row, descending?). Keys must end in a unique column.
+# CROSS JOIN pins the keyed table as the outer loop so the planner never trades the ordered index for a sort.
+P_PAGE=("SELECT patient_id,name,age,gender,phone,address,added_on FROM patients",("patient_id",),(0,),True)
+A_PAGE=("""SELECT a.appointment_id,a.patient_id,p.name,a.doctor,a.date,a.time,a.reason,a.status
+           FROM appointments a CROSS JOIN patients p ON a.patient_id=p.patient_id""",("a.date","a.time","a.appointment_id"),(4,5,0),False)
+B_PAGE=("""SELECT b.bill_id,b.patient_id,p.name,b.total,b.created_on
+           FROM bills b CROSS JOIN patients p ON b.patient_id=p.patient_id""",("b.created_on","b.bill_id"),(4,0),True)
+
+def page_sql(spec,after=False,fwd=True,where=""):
+    sel,keys,_,desc=spec; lt=desc==fwd; conds=[where] if where else []
+    if after: conds.append(f"({','.join(keys)}){'<' if lt else '>'}({','.join('?'*len(keys))})")
+    return sel+(" WHERE "+" AND ".join(conds) if conds else "")+" ORDER BY "+",".join(k+(" DESC" if lt else "") for k in keys)+" LIMIT ?"
+
+def fetch_page(spec,after=None,fwd=True,n=200,where="",params=()):
+    rows=q(page_sql(spec,after is not None,fwd,where),(*params,*(after or ()),n),"all")
+    return rows if fwd else rows[::-1]
+
+class TreePager:
+    # Feeds a Treeview one page at a time as it scrolls and keeps at most `cap` rows in the widget,
+    # dropping pages from the far end and re-fetching them if the user scrolls back.
+    def __init__(s,tv,spec,page=200,cap=1000):
+        s.tv,s.spec,s.page,s.cap=tv,spec,page,cap; s.where,s.params="",()
+        s.keys={}; s.more_up=s.more_down=s.busy=False
+        tv.configure(yscrollcommand=s._scrolled)
+    def key(s,row): return tuple(row[i] for i in s.spec[2])
+    def reload(s,where="",params=()):
+        s.where,s.params=where,params; s.tv.delete(*s.tv.get_children()); s.keys.clear()
+        rows=fetch_page(s.spec,None,True,s.page,where,params)
+        for r in rows: s.keys[s.tv.insert("","end",values=r)]=s.key(r)
+        s.more_up=False; s.more_down=len(rows)==s.page
+    def show(s,rows):
+        s.tv.delete(*s.tv.get_children()); s.keys.clear(); s.more_up=s.more_down=False
+        for r in rows: s.keys[s.tv.insert("","end",values=r)]=s.key(r)
+    def _scrolled(s,first,last):
+        if s.busy: return
+        if float(last)>=0.98 and s.more_down: s.busy=True; s.tv.after_idle(s._down)
+        elif float(first)<=0.02 and s.more_up: s.busy=True; s.tv.after_idle(s._up)
+    def _anchor(s,kids): return kids[min(len(kids)-1,int(float(s.tv.yview()[0])*len(kids)))] if kids else None
+    def _restore(s,anchor):
+        kids=s.tv.get_children()
+        if anchor and kids and s.tv.exists(anchor): s.tv.yview_moveto(s.tv.index(anchor)/len(kids))
+    def _drop(s,iids): [s.keys.pop(i) for i in iids]; s.tv.delete(*iids)
+    def _down(s):
+        try:
+            kids=s.tv.get_children(); anchor=s._anchor(kids)
+            if not kids: return
+            rows=fetch_page(s.spec,s.keys[kids[-1]],True,s.page,s.where,s.params)
+            for r in rows: s.keys[s.tv.insert("","end",values=r)]=s.key(r)
+            s.more_down=len(rows)==s.page; extra=len(kids)+len(rows)-s.cap
+            if extra>0: s._drop(kids[:extra]); s.more_up=True
+            s._restore(anchor)
+        finally: s.busy=False
+    def _up(s):
+        try:
+            kids=s.tv.get_children(); anchor=s._anchor(kids)
+            if not kids: return
+            rows=fetch_page(s.spec,s.keys[kids[0]],False,s.page,s.where,s.params)
+            for i,r in enumerate(rows): s.keys[s.tv.insert("",i,values=r)]=s.key(r)
+            s.more_up=len(rows)==s.page; extra=len(kids)+len(rows)-s.cap
+            if extra>0: s._drop(kids[-extra:]); s.more_down=True
+            s._restore(anchor)
+        finally: s.busy=False
+
+# ---------- Query plan check ----------
+# Every query the app issues, with sample parameters. check_plans() fails if one falls back to a full
+# table scan or an unindexed sort; entries flagged scan_ok/sort_ok are expected to do so. A plain SCAN
+# is fine when it already yields ORDER BY order and the query stops at a LIMIT (first page of a list).
+def app_queries():
+    qs=[("bill",BILL_SQL,(1,)),("bill items",ITEMS_SQL,(1,)),("invoice patient",PATIENT_SQL,(1,)),
+        ("billing patient","SELECT patient_id,name FROM patients WHERE patient_id=?",(1,)),
+        ("patient count","SELECT COUNT(*) FROM patients",(),"scan_ok"),("stock check",VERIFY_STOCK_SQL,(),"scan_ok"),
+        ("medicine by id","SELECT medicine_id,name,price,stock FROM medicines WHERE medicine_id=?",(1,)),("doctor day",DAY_SQL,("Dr. A","2025-01-01","2025-01-01U"))]
+    for name,spec,after in (("patients",P_PAGE,(1,)),("appointments",A_PAGE,("2025-01-01","10:00",1)),("bills",B_PAGE,("2025-01-01",1))):
+        qs+=[(f"{name} first page",page_sql(spec),(200,)),(f"{name} next page",page_sql(spec,True),(*after,200)),
+             (f"{name} previous page",page_sql(spec,True,False),(*after,200))]
+    qs+=[("patient search",SEARCH_PATIENTS_SQL,('"ram"*',500,500),"sort_ok"),
+         ("patient search short",SEARCH_PATIENTS_SHORT_SQL,('"a"*',SEARCH_CANDIDATES,500),"sort_ok"),
+         ("medicine search",SEARCH_MEDICINES_SQL,('"par"*',500,500),"sort_ok"),
+         ("medicine search short",SEARCH_MEDICINES_SHORT_SQL,('"a"*',SEARCH_CANDIDATES,500),"sort_ok"),
+         ("medicine list","SELECT medicine_id,name,description,price,stock FROM medicines ORDER BY name",(),"scan_ok","sort_ok")]
+    for t in EXPORTS: qs.append((f"{t} export",export_sql(t)[0],(),"scan_ok"))
+    today=("2025-01-01",)*3
+    qs+=[(f"dashboard {k}",sql,today[:sql.count("?")],*(("scan_ok","sort_ok") if k=="doctors" else ())) for k,sql in DASHBOARD.items()]
+    qs+=[("batch invoices by date",*batch_sql("2025-01-01","2025-02-01")),("batch invoices by patient",*batch_sql(patient=1)),
+         ("batch invoice items",batch_items_sql(3),(1,2,3))]
+    qs+=[("appointments export since",*export_sql("appointments","2025-01-01")),("bills export since",*export_sql("bills","2025-01-01"))]
+    return qs
+
+def check_plans(out=print):
+    bad=0
+    for name,sql,params,*flags in app_queries():
+        plan=[r[3] for r in q("EXPLAIN QUERY PLAN "+sql,params,"all")]
+        mat={m.group(1) for d in plan for m in [re.match(r"(?:MATERIALIZE|CO-ROUTINE) (\w+)",d)] if m}
+        sorts=[d for d in plan if d.startswith("USE TEMP B-TREE")]
+        ordered=not sorts and re.search(r"LIMIT \?\s*$",sql)
+        why=[d for d in plan if "scan_ok" not in flags and not ordered and re.match(r"SCAN (\w+)$",d) and d.split()[1] not in mat]
+        why+=[d for d in sorts if "sort_ok" not in flags]
+        bad+=bool(why); out(f"{'FAIL' if why else 'ok  '} {name}: "+"; ".join(plan))
+    return bad
+
 # ---------- App ----------
 class App:
     def __init__(s,root):
-        s.r=root; s.r.title("Hospital Management System"); s.r.geometry("1000x640")
+        s.r=root; s.jobs={}; s.r.title("Hospital Management System"); s.r.geometry("1000x640")
+        s.search_q,s.search_seq,s.search_done=queue.Queue(),{},{}; threading.Thread(target=s.search_worker,daemon=True).start()
         nb=ttk.Notebook(s.r); nb.pack(fill="both",expand=True,padx=6,pady=6)
         s.tp, s.ta, s.tm, s.tb, s.tr = (ttk.Frame(nb) for _ in range(5))
         nb.add(s.tp,text="Patients"); nb.add(s.ta,text="Appointments"); nb.add(s.tm,text="Pharmacy"); nb.add(s.tb,text="Billing"); nb.add(s.tr,text="Reports")
         s.build_patients(); s.build_appointments(); s.build_meds(); s.build_billing(); s.build_reports()
+        # Tabs load their data the first time they are opened.
+        s.nb=nb; s.lazy={str(s.tp):s.p_load,str(s.ta):s.a_load,str(s.tm):s.m_load,str(s.tb):s.b_load,str(s.tr):s.dash_load}
+        nb.bind("<<NotebookTabChanged>>",s.tab_opened); s.tab_opened()
+        s.p_kw.trace_add("write",lambda *_:s.debounce("p",s.p_search)); s.m_kw.trace_add("write",lambda *_:s.debounce("m",s.m_load))
+    def debounce(s,key,f,ms=150):
+        j=s.jobs.pop(key,None)
+        if j: s.r.after_cancel(j)
+        s.jobs[key]=s.r.after(ms,f)
+    # Searches run on one worker thread (with its own connection) so typing never waits on SQLite.
+    # Each box keeps a sequence number; queued or finished searches that are no longer the newest are dropped.
+    def search_reset(s,key):
+        s.search_seq[key]=seq=s.search_seq.get(key,0)+1; return seq
+    def search_async(s,key,f,kw,show):
+        seq=s.search_reset(key); s.search_q.put((key,seq,f,kw))
+        def poll():
+            if s.search_seq[key]!=seq: return
+            r=s.search_done.pop(key,None)
+            if r is None or r[0]!=seq: return s.r.after(15,poll)
+            if isinstance(r[1],Exception): messagebox.showerror("Search failed",str(r[1]))
+            else: show(r[1])
+        poll()
+    def search_worker(s):
+        while True:
+            key,seq,f,kw=s.search_q.get()
+            if s.search_seq[key]!=seq: continue
+            try: r=f(kw)
+            except Exception as e: r=e
+            s.search_done[key]=(seq,r)
+    def tab_opened(s,_=None):
+        f=s.lazy.pop(s.nb.select(),None)
+        if f: f()
 
     # ---- Patients
     def build_patients(s):
@@ -90,7 +654,7 @@ class App:
         ttk.Button(top,text="Search",command=s.p_search).pack(side="left",padx=3); ttk.Button(top,text="Refresh",command=s.p_load).pack(side="left",padx=3)
         cols=("id","name","age","gender","phone","address","added_on"); s.p_tv=ttk.Treeview(R,columns=cols,show="headings",selectmode="browse")
         [s.p_tv.heading(c,text=c.title()) or s.p_tv.column(c,width=120) for c in cols]; s.p_tv.column("address",width=240); s.p_tv.pack(fill="both",expand=True)
-        s.p_tv.bind("<<TreeviewSelect>>",s.p_fill); s.p_load()
+        s.p_tv.bind("<<TreeviewSelect>>",s.p_fill); s.p_pager=TreePager(s.p_tv,P_PAGE)
 
     def p_add(s):
         n=s.p_name.get().strip(); 
@@ -98,9 +662,7 @@ class App:
         pid=q("INSERT INTO patients(name,age,gender,phone,address,added_on) VALUES(?,?,?,?,?,?)",
               (n, s.p_age.get().strip() or None, s.p_gender.get().strip(), s.p_phone.get().strip(), s.p_addr.get("1.0","end").strip(), now()))
         messagebox.showinfo("Added",f"Patient ID {pid}"); s.p_load()
-    def p_load(s):
-        for i in s.p_tv.get_children(): s.p_tv.delete(i)
-        for r in q("SELECT patient_id,name,age,gender,phone,address,added_on FROM patients ORDER BY patient_id DESC",(),"all"): s.p_tv.insert("","end",values=r)
+    def p_load(s): s.p_pager.reload()
     def p_fill(s,_=None):
         sel=s.p_tv.selection(); 
         if not sel: return
@@ -114,10 +676,9 @@ class App:
           (s.p_name.get().strip(), s.p_age.get().strip() or None, s.p_gender.get().strip(), s.p_phone.get().strip(), s.p_addr.get("1.0","end").strip(), s.pid))
         messagebox.showinfo("Updated","Patient updated."); s.p_load()
     def p_search(s):
-        kw=f"%{s.p_kw.get().strip()}%"; rows=q("SELECT patient_id,name,age,gender,phone,address,added_on FROM patients WHERE name LIKE ? OR phone LIKE ? OR address LIKE ?",
-                                              (kw,kw,kw),"all"); 
-        for i in s.p_tv.get_children(): s.p_tv.delete(i)
-        [s.p_tv.insert("",'end',values=r) for r in rows]
+        s.jobs.pop("p",None); kw=s.p_kw.get().strip()
+        if kw: return s.search_async("p",search_patients,kw,s.p_pager.show)
+        s.search_reset("p"); s.p_load()
 
     # ---- Appointments
     def build_appointments(s):
@@ -128,23 +689,33 @@ class App:
         s.a_pid,s.a_doc,s.a_date,s.a_time,s.a_reason=wids
         ttk.Button(T,text="Book",command=s.a_book).pack(side="left",padx=4)
         M=ttk.Frame(s.ta); M.pack(fill="x",padx=6); ttk.Button(M,text="Refresh",command=s.a_load).pack(side="left"); ttk.Button(M,text="Cancel Selected",command=s.a_cancel).pack(side="left",padx=4)
+        ttk.Button(M,text="Free Slots",command=s.a_free).pack(side="left",padx=4)
+        ttk.Label(M,text="Repeat weekly x").pack(side="left",padx=(12,0)); s.a_repeat=ttk.Spinbox(M,from_=1,to=52,width=4); s.a_repeat.set(1); s.a_repeat.pack(side="left")
         cols=("id","pid","patient","doctor","date","time","reason","status"); s.a_tv=ttk.Treeview(s.ta,columns=cols,show="headings")
-        [s.a_tv.heading(c,text=c.title()) or s.a_tv.column(c,width=120) for c in cols]; s.a_tv.pack(fill="both",expand=True,padx=6,pady=6); s.a_load()
+        [s.a_tv.heading(c,text=c.title()) or s.a_tv.column(c,width=120) for c in cols]; s.a_tv.pack(fill="both",expand=True,padx=6,pady=6)
+        s.a_pager=TreePager(s.a_tv,A_PAGE)
     def a_book(s):
         try:
-            q("INSERT INTO appointments(patient_id,doctor,date,time,reason,created_on) VALUES(?,?,?,?,?,?)",
-              (int(s.a_pid.get()), s.a_doc.get().strip(), s.a_date.get().strip(), s.a_time.get().strip(), s.a_reason.get().strip(), now()))
-            messagebox.showinfo("Booked","Appointment created."); s.a_load()
+            when=parse_when(s.a_date.get(),s.a_time.get())
+            ids=SCHEDULE.book_recurring(int(s.a_pid.get()),s.a_doc.get(),when,int(s.a_repeat.get() or 1),reason=s.a_reason.get().strip())
+            messagebox.showinfo("Booked",f"{len(ids)} appointment(s) created." if len(ids)>1 else "Appointment created."); s.a_load()
+        except SlotConflict as e:
+            free=SCHEDULE.free_slots(e.doctor,e.times[0],3)
+            messagebox.showerror("Error",str(e)+("\n\nNext free: "+", ".join(f.strftime("%Y-%m-%d %H:%M") for f in free) if free else ""))
         except Exception as e: messagebox.showerror("Error",str(e))
-    def a_load(s):
-        for i in s.a_tv.get_children(): s.a_tv.delete(i)
-        rows=q("""SELECT a.appointment_id,a.patient_id,p.name,a.doctor,a.date,a.time,a.reason,a.status
-                  FROM appointments a JOIN patients p ON a.patient_id=p.patient_id ORDER BY a.date,a.time""",(),"all")
-        [s.a_tv.insert("",'end',values=r) for r in rows]
+    def a_free(s):
+        doc=s.a_doc.get().strip()
+        if not doc: return messagebox.showwarning("Doctor","Enter a doctor.")
+        try: after=parse_when(s.a_date.get(),s.a_time.get() or "00:00") if s.a_date.get().strip() else None
+        except ValueError as e: return messagebox.showerror("Error",str(e))
+        free=SCHEDULE.free_slots(doc,after,5)
+        if free: s.a_date.delete(0,"end"); s.a_date.insert(0,free[0].strftime("%Y-%m-%d")); s.a_time.delete(0,"end"); s.a_time.insert(0,free[0].strftime("%H:%M"))
+        messagebox.showinfo("Free Slots",f"{doc}:\n"+"\n".join(f.strftime("%Y-%m-%d %H:%M") for f in free))
+    def a_load(s): SCHEDULE.clear(); s.a_pager.reload()
     def a_cancel(s):
         sel=s.a_tv.selection(); 
         if not sel: return messagebox.showwarning("Select","Choose an appointment.")
-        aid=s.a_tv.item(sel[0])["values"][0]; q("UPDATE appointments SET status='Cancelled' WHERE appointment_id=?", (aid,))
+        aid=s.a_tv.item(sel[0])["values"][0]; SCHEDULE.cancel(aid)
         messagebox.showinfo("Cancelled",f"Appointment {aid} cancelled."); s.a_load()
 
     # ---- Pharmacy
@@ -161,19 +732,20 @@ class App:
         ttk.Button(top,text="Refresh",command=s.m_load).pack(side="left",padx=4); ttk.Button(top,text="Export CSV",command=s.m_export).pack(side="left",padx=4)
         cols=("id","name","desc","price","stock"); s.m_tv=ttk.Treeview(R,columns=cols,show="headings")
         [s.m_tv.heading(c,text=c.title()) or s.m_tv.column(c,width=140) for c in cols]; s.m_tv.pack(fill="both",expand=True)
-        s.m_tv.bind("<<TreeviewSelect>>",s.m_fill); s.m_load()
+        s.m_tv.bind("<<TreeviewSelect>>",s.m_fill)
     def m_add(s):
         if not s.m_name.get().strip(): return messagebox.showwarning("Required","Name needed")
         try: price=float(s.m_price.get().strip()); stock=int(s.m_stock.get().strip() or 0)
         except: return messagebox.showwarning("Invalid","Enter valid price/stock")
-        q("INSERT INTO medicines(name,description,price,stock) VALUES(?,?,?,?)",(s.m_name.get().strip(), s.m_desc.get().strip(), price, stock))
+        try: add_medicine(s.m_name.get().strip(), s.m_desc.get().strip(), price, stock)
+        except Exception as e: return messagebox.showerror("Error",str(e))
         messagebox.showinfo("Added","Medicine added."); s.m_load()
     def m_load(s):
-        for i in s.m_tv.get_children(): s.m_tv.delete(i)
-        rows=q("SELECT medicine_id,name,description,price,stock FROM medicines ORDER BY name",(),"all")
-        k=s.m_kw.get().strip().lower()
-        for r in rows:
-            if not k or k in str(r[1]).lower() or k in str(r[2]).lower(): s.m_tv.insert("",'end',values=r)
+        s.jobs.pop("m",None); k=s.m_kw.get().strip()
+        if k: return s.search_async("m",search_medicines,k,s.m_show)
+        s.search_reset("m"); s.m_show(q("SELECT medicine_id,name,description,price,stock FROM medicines ORDER BY name",(),"all"))
+    def m_show(s,rows):
+        s.m_tv.delete(*s.m_tv.get_children()); [s.m_tv.insert("",'end',values=r) for r in rows]
     def s_get_sel(s,tv): 
         sel=tv.selection(); return tv.item(sel[0])["values"] if sel else None
     def m_fill(s,_=None):
@@ -181,26 +753,29 @@ class App:
         if not v: return
         s.mid=v[0]; s.m_name.delete(0,"end"); s.m_name.insert(0,v[1])
         s.m_desc.delete(0,"end"); s.m_desc.insert(0,v[2] or "")
-        s.m_price.delete(0,"end"); s.m_price.insert(0,str(v[3])); s.m_stock.delete(0,"end"); s.m_stock.insert(0,str(v[4]))
+        s.m_price.delete(0,"end"); s.m_price.insert(0,str(v[3])); s.m_stock.delete(0,"end"); s.m_stock.insert(0,str(v[4])); s.m_stock0=int(v[4])
+    # Stock edits are applied as a relative adjustment against the value shown, so sales made meanwhile are kept.
     def m_upd(s):
         if not hasattr(s,"mid"): return messagebox.showwarning("Select","Choose a medicine.")
         try:
-            q("UPDATE medicines SET name=?,description=?,price=?,stock=? WHERE medicine_id=?",
-              (s.m_name.get().strip(), s.m_desc.get().strip(), float(s.m_price.get().strip()), int(s.m_stock.get().strip()), s.mid))
-            messagebox.showinfo("Updated","Medicine updated."); s.m_load()
+            delta=int(s.m_stock.get().strip())-s.m_stock0
+            with tx():
+                q("UPDATE medicines SET name=?,description=?,price=? WHERE medicine_id=?",
+                  (s.m_name.get().strip(), s.m_desc.get().strip(), float(s.m_price.get().strip()), s.mid))
+                if delta: adjust_stock(s.mid,delta,"manual adjustment")
+            s.m_stock0+=delta; messagebox.showinfo("Updated","Medicine updated."); s.m_load()
         except Exception as e: messagebox.showerror("Error",str(e))
-    def m_export(s):
-        export_csv(q("SELECT medicine_id,name,description,price,stock FROM medicines",(),"all"),
-                   ["medicine_id","name","description","price","stock"],"medicines.csv")
+    def m_export(s): s.export("medicines")
 
     # ---- Billing
     def build_billing(s):
         T=ttk.Frame(s.tb); T.pack(fill="x",padx=6,pady=6)
         ttk.Label(T,text="Patient ID:").pack(side="left"); s.b_pid=ttk.Entry(T,width=8); s.b_pid.pack(side="left",padx=4)
         ttk.Button(T,text="Load Patient",command=s.b_load_patient).pack(side="left",padx=4)
-        cols=("desc","qty","unit","amount"); s.b_tv=ttk.Treeview(s.tb,columns=cols,show="headings",height=8)
+        cols=("desc","qty","unit","amount","medicine"); s.b_tv=ttk.Treeview(s.tb,columns=cols,show="headings",height=8)
         [s.b_tv.heading(c,text=c.title()) or s.b_tv.column(c,width=180 if c=='desc' else 90) for c in cols]; s.b_tv.pack(fill="x",padx=6)
         A=ttk.Frame(s.tb); A.pack(fill="x",padx=6,pady=6)
+        ttk.Label(A,text="Medicine ID:").pack(side="left"); s.bi_med=ttk.Entry(A,width=6); s.bi_med.pack(side="left",padx=3)
         ttk.Label(A,text="Description:").pack(side="left"); s.bi_desc=ttk.Entry(A,width=28); s.bi_desc.pack(side="left",padx=3)
         ttk.Label(A,text="Qty:").pack(side="left"); s.bi_qty=ttk.Entry(A,width=6); s.bi_qty.pack(side="left",padx=3)
         ttk.Label(A,text="Unit:").pack(side="left"); s.bi_price=ttk.Entry(A,width=10); s.bi_price.pack(side="left",padx=3)
@@ -214,36 +789,39 @@ class App:
         ttk.Label(s.tb,text="Recent Bills",font=("",10,"bold")).pack(anchor="w",padx=6)
         s.b_list=ttk.Treeview(s.tb,columns=("id","pid","name","total","on"),show="headings",height=6)
         [s.b_list.heading(c,text=c.title()) or s.b_list.column(c,width=160) for c in ("id","pid","name","total","on")]; s.b_list.pack(fill="both",expand=True,padx=6,pady=4)
-        ttk.Button(s.tb,text="Refresh Bills",command=s.b_load).pack(padx=6,pady=2); s.b_load()
+        ttk.Button(s.tb,text="Refresh Bills",command=s.b_load).pack(padx=6,pady=2); s.b_pager=TreePager(s.b_list,B_PAGE)
 
     def b_load_patient(s):
         r=q("SELECT patient_id,name FROM patients WHERE patient_id=?", (s.b_pid.get().strip(),), "one")
         if not r: return messagebox.showerror("Not found","Invalid patient ID")
         s.cur_patient=r; messagebox.showinfo("Loaded",f"Patient: {r[1]}")
 
+    # A Medicine ID fills in name and price from the pharmacy; the stock is taken when the bill is created.
     def b_add_item(s):
+        med=s.bi_med.get().strip(); m=None
+        if med:
+            m=q("SELECT medicine_id,name,price,stock FROM medicines WHERE medicine_id=?",(med,),"one")
+            if not m: return messagebox.showerror("Not found","Invalid medicine ID")
+            if not s.bi_desc.get().strip(): s.bi_desc.insert(0,m[1])
+            if not s.bi_price.get().strip(): s.bi_price.insert(0,str(m[2]))
         try: qty=int(s.bi_qty.get()); price=float(s.bi_price.get())
         except: return messagebox.showwarning("Invalid","Enter valid qty and price")
         d=s.bi_desc.get().strip(); 
         if not d: return messagebox.showwarning("Required","Description needed")
-        s.b_tv.insert("",'end',values=(d,qty,f"{price:.2f}",f"{qty*price:.2f}"))
-        [x.delete(0,"end") for x in (s.bi_desc,s.bi_qty,s.bi_price)]; s.b_total()
+        if m and qty>m[3]: return messagebox.showwarning("Stock",f"Only {m[3]} of {m[1]} in stock")
+        s.b_tv.insert("",'end',values=(d,qty,f"{price:.2f}",f"{qty*price:.2f}",m[0] if m else ""))
+        [x.delete(0,"end") for x in (s.bi_med,s.bi_desc,s.bi_qty,s.bi_price)]; s.b_total()
     def b_total(s):
         t=sum(float(s.b_tv.item(i)["values"][3]) for i in s.b_tv.get_children()); s.total.set(f"{t:.2f}")
     def b_create(s):
-        if not hasattr(s,"cur_patient"): return messagebox.showwarning("Patient","Load a patient first")
-        items=[ {"description":v[0],"qty":int(v[1]),"unit_price":float(v[2])} for v in (s.b_tv.item(i)["values"] for i in s.b_tv.get_children()) ]
+        if not getattr(s,"cur_patient",None): return messagebox.showwarning("Patient","Load a patient first")
+        items=[ {"description":str(v[0]),"qty":int(v[1]),"unit_price":float(v[2]),"medicine_id":int(v[4]) if str(v[4]) else None}
+                for v in (s.b_tv.item(i)["values"] for i in s.b_tv.get_children()) ]
         if not items: return messagebox.showwarning("Items","Add at least one item")
-        total=sum(it["qty"]*it["unit_price"] for it in items)
-        bid=q("INSERT INTO bills(patient_id,total,created_on) VALUES(?,?,?)",(s.cur_patient[0],total,now()))
-        for it in items: q("INSERT INTO bill_items(bill_id,description,qty,unit_price,amount) VALUES(?,?,?,?,?)",
-                           (bid,it["description"],it["qty"],it["unit_price"],it["qty"]*it["unit_price"]))
+        try: bid=create_bill(s.cur_patient[0],items)
+        except Exception as e: return messagebox.showerror("Error",str(e))
         messagebox.showinfo("Created",f"Bill {bid} created."); s.b_tv.delete(*s.b_tv.get_children()); s.b_total(); s.cur_patient=None; s.b_pid.delete(0,"end"); s.b_load()
-    def b_load(s):
-        for i in s.b_list.get_children(): s.b_list.delete(i)
-        rows=q("""SELECT b.bill_id,b.patient_id,p.name,b.total,b.created_on
-                  FROM bills b JOIN patients p ON b.patient_id=p.patient_id ORDER BY b.created_on DESC""",(),"all")
-        [s.b_list.insert("",'end',values=r) for r in rows]
+    def b_load(s): s.b_pager.reload()
     def b_save_txt(s):
         sel=s.b_list.selection(); 
         if not sel: return messagebox.showwarning("Select","Choose a bill")
@@ -256,31 +834,96 @@ class App:
 
     # ---- Reports
     def build_reports(s):
-        f=ttk.Frame(s.tr); f.pack(padx=8,pady=8,anchor="w")
-        ttk.Button(f,text="Export Patients CSV",command=lambda:export_csv(q("SELECT patient_id,name,age,gender,phone,address,added_on FROM patients",(),"all"),
-                 ["patient_id","name","age","gender","phone","address","added_on"],"patients.csv")).pack(pady=4,anchor="w")
-        ttk.Button(f,text="Export Appointments CSV",command=lambda:export_csv(
-            q("""SELECT a.appointment_id,a.patient_id,p.name,a.doctor,a.date,a.time,a.reason,a.status
-                 FROM appointments a JOIN patients p ON a.patient_id=p.patient_id""",(),"all"),
-            ["appointment_id","patient_id","patient_name","doctor","date","time","reason","status"],"appointments.csv")).pack(pady=4,anchor="w")
-        ttk.Button(f,text="Export Medicines CSV",command=lambda:export_csv(
-            q("SELECT medicine_id,name,description,price,stock FROM medicines",(),"all"),
-            ["medicine_id","name","description","price","stock"],"medicines.csv")).pack(pady=4,anchor="w")
-        ttk.Button(f,text="Export Bills CSV",command=lambda:export_csv(
-            q("""SELECT b.bill_id,b.patient_id,p.name,b.total,b.created_on
-                 FROM bills b JOIN patients p ON b.patient_id=p.patient_id""",(),"all"),
-            ["bill_id","patient_id","patient_name","total","created_on"],"bills.csv")).pack(pady=4,anchor="w")
+        f=ttk.Frame(s.tr); f.pack(side="left",fill="y",padx=8,pady=8)
+        for t in EXPORTS: ttk.Button(f,text=f"Export {t.title()} CSV",command=lambda t=t:s.export(t)).pack(pady=4,fill="x")
+        s.x_status=tk.StringVar(); ttk.Label(f,textvariable=s.x_status,wraplength=180).pack(anchor="w",pady=(12,2))
+        s.x_cancel=ttk.Button(f,text="Cancel Export",state="disabled"); s.x_cancel.pack(fill="x"); s.x_job=None
+        D=ttk.Frame(s.tr); D.pack(side="left",fill="both",expand=True,padx=8,pady=8)
+        top=ttk.Frame(D); top.pack(fill="x"); s.d_today=tk.StringVar()
+        ttk.Label(top,textvariable=s.d_today,font=("",10,"bold")).pack(side="left"); ttk.Button(top,text="Refresh",command=s.dash_load).pack(side="right")
+        def tv(parent,title,cols):
+            F=ttk.Frame(parent); F.pack(side="left",fill="both",expand=True,padx=3,pady=6); ttk.Label(F,text=title,font=("",10,"bold")).pack(anchor="w")
+            t=ttk.Treeview(F,columns=cols,show="headings",height=8); [t.heading(c,text=c.title()) or t.column(c,width=90) for c in cols]; t.pack(fill="both",expand=True); return t
+        G=ttk.Frame(D); G.pack(fill="both",expand=True); H=ttk.Frame(D); H.pack(fill="both",expand=True)
+        s.d_rev=tv(G,"Revenue by Day",("day","bills","revenue")); s.d_vis=tv(G,"Upcoming Visits",("day","visits"))
+        s.d_docs=tv(H,"Visits by Doctor",("doctor","visits","cancelled")); s.d_low=tv(H,f"Low Stock (<{LOW_STOCK})",("id","name","stock"))
+    def dash_load(s):
+        d=dashboard(); b,r,v=d["today"]
+        s.d_today.set(f"Today: {b or 0} bills, {r or 0:.2f} revenue, {v or 0} visits")
+        for t,k in ((s.d_rev,"revenue"),(s.d_vis,"visits"),(s.d_docs,"doctors"),(s.d_low,"low_stock")):
+            t.delete(*t.get_children()); [t.insert("","end",values=x) for x in d[k]]
+
+    # Exports run on a worker thread; the Tk thread only polls the shared counter.
+    def export(s,name):
+        if s.x_job: return messagebox.showwarning("Busy","An export is already running.")
+        f=filedialog.asksaveasfilename(defaultextension=".csv",initialfile=f"{name}.csv",filetypes=[("CSV","*.csv"),("Gzipped CSV","*.csv.gz")])
+        if not f: return
+        job=s.x_job={"name":name,"path":f,"rows":0,"done":False,"result":None,"error":None,"cancel":threading.Event()}
+        def work():
+            try: job["result"]=export_table(name,f,progress=lambda n:job.__setitem__("rows",n),cancel=job["cancel"])
+            except Exception as e: job["error"]=e
+            finally: close_thread_db(); job["done"]=True
+        s.x_cancel.configure(state="normal",command=job["cancel"].set); threading.Thread(target=work,daemon=True).start(); s.export_poll()
+    def export_poll(s):
+        job=s.x_job; s.x_status.set(f"Exporting {job['name']}: {job['rows']:,} rows")
+        if not job["done"]: return s.r.after(200,s.export_poll)
+        s.x_job=None; s.x_cancel.configure(state="disabled"); s.x_status.set("")
+        if job["error"]: messagebox.showerror("Export failed",str(job["error"]))
+        elif job["result"] is None: messagebox.showinfo("Cancelled","Export cancelled.")
+        else: messagebox.showinfo("Exported",f"Saved {job['result']:,} rows to {job['path']}")
 
 # ---------- Seed on first run ----------
 def seed():
-    if q("SELECT COUNT(*) FROM patients",(),"one")[0]: return
-    q("INSERT INTO patients(name,age,gender,phone,address,added_on) VALUES(?,?,?,?,?,?)",("Ram Kumar",30,"Male","9876543210","123 MG Road",now()))
-    q("INSERT INTO patients(name,age,gender,phone,address,added_on) VALUES(?,?,?,?,?,?)",("Sita Devi",28,"Female","9123456780","45 Park Lane",now()))
-    q("INSERT INTO medicines(name,description,price,stock) VALUES(?,?,?,?)",("Paracetamol","500mg tablet",2.5,200))
-    q("INSERT INTO medicines(name,description,price,stock) VALUES(?,?,?,?)",("Amoxicillin","250mg capsule",5.0,120))
-    q("INSERT INTO appointments(patient_id,doctor,date,time,reason,created_on) VALUES(?,?,?,?,?,?)",(1,"Dr. Sharma","2025-08-15","10:00","Fever",now()))
-    q("INSERT INTO appointments(patient_id,doctor,date,time,reason,created_on) VALUES(?,?,?,?,?,?)",(2,"Dr. Mehta","2025-08-16","14:00","Checkup",now()))
+    with tx():
+        if q("SELECT COUNT(*) FROM patients",(),"one")[0]: return
+        q("INSERT INTO patients(name,age,gender,phone,address,added_on) VALUES(?,?,?,?,?,?)",("Ram Kumar",30,"Male","9876543210","123 MG Road",now()))
+        q("INSERT INTO patients(name,age,gender,phone,address,added_on) VALUES(?,?,?,?,?,?)",("Sita Devi",28,"Female","9123456780","45 Park Lane",now()))
+        add_medicine("Paracetamol","500mg tablet",2.5,200)
+        add_medicine("Amoxicillin","250mg capsule",5.0,120)
+        SCHEDULE.book(1,"Dr. Sharma",parse_when("2025-08-15","10:00"),"Fever")
+        SCHEDULE.book(2,"Dr. Mehta",parse_when("2025-08-16","14:00"),"Checkup")
+
+# ---------- Command line ----------
+def cli(argv):
+    global DB
+    ap=argparse.ArgumentParser(prog="hospital.py"); ap.add_argument("--db",default=DB,help="database file (default: %(default)s)")
+    sub=ap.add_subparsers(dest="cmd",required=True)
+    sub.add_parser("reindex",help="rebuild the patient/medicine search index")
+    sub.add_parser("check-plans",help="fail if any app query regresses to a table scan")
+    sub.add_parser("rollups",help="rebuild the dashboard summary tables from history")
+    sub.add_parser("stock-check",help="list medicines whose stock disagrees with the ledger")
+    x=sub.add_parser("export",help="stream a table to CSV")
+    x.add_argument("table",choices=list(EXPORTS)); x.add_argument("-o","--output",help="file to write, .gz to compress, - for stdout")
+    x.add_argument("--since",help="only rows on/after this date (YYYY-MM-DD)"); x.add_argument("--until",help="only rows before this date")
+    x.add_argument("--gzip",action="store_true"); x.add_argument("--chunk",type=int,default=5000)
+    v=sub.add_parser("invoices",help="render many invoices in parallel")
+    v.add_argument("--since",help="bills created on/after this date"); v.add_argument("--until",help="bills created before this date")
+    v.add_argument("--patient",type=int); v.add_argument("--format",choices=list(RENDERERS),default="pdf")
+    v.add_argument("--out",default="invoices",help="output directory (default: %(default)s)"); v.add_argument("--zip",help="pack the invoices into this zip file")
+    v.add_argument("--workers",type=int,help="worker processes (default: one per core)"); v.add_argument("--chunk",type=int,default=500)
+    a=ap.parse_args(argv); DB=a.db; init_db()
+    try:
+        if a.cmd=="reindex": rebuild_search(); print("Search index rebuilt.")
+        if a.cmd=="check-plans": return 1 if check_plans() else 0
+        if a.cmd=="rollups": rebuild_rollups(); print("Rollups rebuilt.")
+        if a.cmd=="stock-check":
+            bad=verify_stock()
+            for mid,name,st,led in bad: print(f"{mid} {name}: stock {st}, ledger {led}")
+            print(f"{len(bad)} mismatches."); return 1 if bad else 0
+        if a.cmd=="export":
+            path=a.output or f"{a.table}.csv"+(".gz" if a.gzip else "")
+            if a.gzip and path=="-": ap.error("--gzip cannot write to stdout")
+            if a.gzip and path!="-" and not path.endswith(".gz"): path+=".gz"
+            try: n=export_table(a.table,path,a.since,a.until,chunk=a.chunk)
+            except ValueError as e: ap.error(str(e))
+            print(f"Exported {n:,} {a.table} rows to {path}",file=sys.stderr)
+        if a.cmd=="invoices":
+            try: r=batch_invoices(a.since,a.until,a.patient,a.format,a.out,a.zip,a.workers,a.chunk)
+            except RuntimeError as e: ap.error(str(e))
+            print(f"Rendered {r['invoices']:,} invoices in {r['seconds']}s ({r['per_second']}/s) -> {r['output']}")
+        return 0
+    finally: close_db()
 
 if __name__=="__main__":
-    init_db(); seed()
-    root=tk.Tk(); App(root); root.mainloop()
+    if len(sys.argv)>1: sys.exit(cli(sys.argv[1:]))
+    init_db(); seed(); root=tk.Tk(); App(root); root.mainloop(); close_db()
@@ -0,0 +1,25 @@
+import os, sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import hospital as h
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(h, "DB", str(tmp_path / "plans.db"))
+    h.init_db()
+    yield
+    h.close_db()
+
+
+def test_app_queries_use_indexes(db):
+    lines = []
+    assert h.check_plans(lines.append) == 0, "\n".join(lines)
+
+
+def test_missing_index_is_reported(db):
+    h.q("DROP INDEX bill_items_bill")
+    lines = []
+    assert h.check_plans(lines.append) > 0
+    assert any(l.startswith("FAIL") and "SCAN" in l for l in lines)